@@ -3,24 +3,40 @@
 import pandas as pd
 import numpy as np
 
+from analysis.data_processing import ENGAGEMENT_LEVEL_DTYPE
+
 class BehaviorAnalyzer:
     def analyze_user_behavior(self, df):
         """Analyze user behavioral patterns"""
-        behavior_metrics = {}
+        filled = df.fillna({
+            'avg_response_time': 0,
+            'avg_words_per_comment': 0,
+            'comment_sentiment_mean': 0
+        })
+        grouped = filled.groupby('author', sort=False)
+        behavior_data = grouped.agg(
+            avg_response_time=('avg_response_time', 'mean'),
+            message_frequency=('author', 'size'),
+            avg_message_length=('avg_words_per_comment', 'mean'),
+            sentiment_mean=('comment_sentiment_mean', 'mean'),
+            active_hours=('hour_posted', 'nunique'),
+            weekend_activity=('is_weekend', 'mean')
+        )
         
-        for user in df['author'].unique():
-            user_posts = df[df['author'] == user]
-            behavior_metrics[user] = {
-                'avg_response_time': user_posts['avg_response_time'].fillna(0).mean(),
-                'message_frequency': len(user_posts),
-                'avg_message_length': user_posts['avg_words_per_comment'].fillna(0).mean(),
-                'sentiment_mean': user_posts['comment_sentiment_mean'].fillna(0).mean(),
-                'engagement_level': user_posts['engagement_level'].mode().iloc[0] if not user_posts['engagement_level'].empty else 'medium',
-                'active_hours': user_posts['hour_posted'].nunique(),
-                'weekend_activity': user_posts['is_weekend'].mean()
-            }
+        # Most frequent engagement level per user (ties go to the lowest level, like mode())
+        engagement_counts = filled.groupby(['author', 'engagement_level'], observed=True).size().unstack(fill_value=0)
+        engagement_mode = engagement_counts.idxmax(axis=1).reindex(behavior_data.index)
+        behavior_data.insert(4, 'engagement_level', engagement_mode.astype(ENGAGEMENT_LEVEL_DTYPE).fillna('medium'))
+        behavior_data.index.name = None
+        
+        # Communication style is fixed per user, so label it once here
+        sentiment = behavior_data['sentiment_mean'].to_numpy()
+        behavior_data['communication_style'] = pd.Categorical(
+            np.select([sentiment > 0.2, sentiment < -0.2], ['Positive', 'Critical'], default='Neutral'),
+            categories=['Positive', 'Neutral', 'Critical']
+        )
         
-        return pd.DataFrame.from_dict(behavior_metrics, orient='index')
+        return behavior_data
 
     def get_user_profile(self, user, behavior_data):
         """Get detailed profile for a user"""
@@ -29,7 +45,9 @@ class BehaviorAnalyzer:
                 'messaging_patterns': {'response_time': '0 hours', 'message_frequency': 0},
                 'engagement_profile': {'engagement_level': 'medium'},
                 'communication_style': 'neutral',
-                'activity_pattern': {'active_hours': 0, 'weekend_activity': '0%'}
+                'activity_pattern': {'active_hours': 0, 'weekend_activity': '0%'},
+                '_response_time_hours': 0.0,
+                '_weekend_activity_frac': 0.0
             }
         
         profile = behavior_data.loc[user]
@@ -41,16 +59,12 @@ class BehaviorAnalyzer:
             'engagement_profile': {
                 'engagement_level': profile['engagement_level']
             },
-            'communication_style': self._get_communication_style(profile),
+            'communication_style': profile['communication_style'],
             'activity_pattern': {
                 'active_hours': int(profile['active_hours']),
                 'weekend_activity': f"{profile['weekend_activity']*100:.1f}%"
-            }
-        }
-
-    def _get_communication_style(self, profile):
-        if profile['sentiment_mean'] > 0.2:
-            return 'Positive'
-        elif profile['sentiment_mean'] < -0.2:
-            return 'Critical'
-        return 'Neutral'
\ No newline at end of file
+            },
+            # Raw values for callers that need numbers rather than display strings
+            '_response_time_hours': float(profile['avg_response_time']),
+            '_weekend_activity_frac': float(profile['weekend_activity'])
+        }
\ No newline at end of file
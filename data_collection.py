@@ -2,21 +2,31 @@
 import praw
 import pandas as pd
 from datetime import datetime, timedelta
-import json
-import time
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 from config.credentials import REDDIT_CREDENTIALS
 
 class RedditDataCollector:
     def __init__(self):
         print("Initializing Reddit API connection...")
-        self.reddit = praw.Reddit(
+        self.reddit = self._connect()
+        self._local = threading.local()
+        
+    def _connect(self):
+        return praw.Reddit(
             client_id=REDDIT_CREDENTIALS['client_id'],
             client_secret=REDDIT_CREDENTIALS['client_secret'],
             user_agent=REDDIT_CREDENTIALS['user_agent']
         )
         
-    def collect_data(self, subreddit='dating', num_posts=200, comments_per_post=10):
+    def _thread_reddit(self):
+        """Reddit instance for the current worker thread (PRAW is not thread safe)."""
+        if not hasattr(self._local, 'reddit'):
+            self._local.reddit = self._connect()
+        return self._local.reddit
+        
+    def collect_data(self, subreddit='dating', num_posts=200, comments_per_post=10, max_workers=8):
         """Collect posts and comments from the last three month"""
         print(f"\nCollecting {num_posts} posts from r/{subreddit}...")
         
@@ -27,48 +37,46 @@ class RedditDataCollector:
         one_month_ago = datetime.utcnow() - timedelta(days=90)
         
         try:
-            for post in subreddit.new(limit=num_posts*2):
-                post_time = datetime.fromtimestamp(post.created_utc)
-                
-                if post_time < one_month_ago:
-                    continue
-                    
-                if len(posts_data) >= num_posts:
-                    break
-                
-                print(f"\nCollecting post {len(posts_data)+1}/{num_posts}")
-                
-                # Get comments
-                post.comments.replace_more(limit=0)
-                comments = []
-                
-                for comment in list(post.comments)[:comments_per_post]:
-                    try:
-                        comments.append({
-                            'comment_id': comment.id,
-                            'author': str(comment.author),
-                            'text': comment.body,
-                            'score': comment.score,
-                            'created_utc': datetime.fromtimestamp(comment.created_utc)
-                        })
-                        print(f"  - Collected comment {len(comments)}/{comments_per_post}")
-                    except Exception as e:
-                        print(f"  - Skipped comment: {str(e)}")
-                
-                if len(comments) >= 5:
-                    post_data = {
-                        'post_id': post.id,
-                        'title': post.title,
-                        'text': post.selftext,
-                        'author': str(post.author),
-                        'created_utc': datetime.fromtimestamp(post.created_utc),
-                        'score': post.score,
-                        'num_comments': len(comments),
-                        'comments': comments
-                    }
-                    posts_data.append(post_data)
+            recent_posts = [
+                post for post in subreddit.new(limit=num_posts*2)
+                if datetime.fromtimestamp(post.created_utc) >= one_month_ago
+            ]
+            
+            # Comment fetching is network bound, so run it on a thread pool;
+            # PRAW's rate limiter handles the backoff
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._fetch_comments, post.id, comments_per_post)
+                    for post in recent_posts
+                ]
                 
-                time.sleep(0.5)
+                try:
+                    for post, future in zip(recent_posts, futures):
+                        if len(posts_data) >= num_posts:
+                            break
+                        
+                        try:
+                            comments = future.result()
+                        except Exception as e:
+                            print(f"  - Skipped post {post.id}: {str(e)}")
+                            continue
+                        
+                        if len(comments) >= 5:
+                            post_data = {
+                                'post_id': post.id,
+                                'title': post.title,
+                                'text': post.selftext,
+                                'author': str(post.author),
+                                'created_utc': datetime.fromtimestamp(post.created_utc),
+                                'score': post.score,
+                                'num_comments': len(comments),
+                                'comments': comments
+                            }
+                            posts_data.append(post_data)
+                            print(f"Collected post {len(posts_data)}/{num_posts} ({len(comments)} comments)")
+                finally:
+                    # Drop queued fetches that are no longer needed, also when collection fails midway
+                    executor.shutdown(wait=False, cancel_futures=True)
                 
             print(f"\nSuccessfully collected {len(posts_data)} posts with comments")
             return pd.DataFrame(posts_data)
@@ -77,15 +85,34 @@ class RedditDataCollector:
             print(f"Error during data collection: {str(e)}")
             return pd.DataFrame(posts_data)
     
+    def _fetch_comments(self, post_id, comments_per_post):
+        """Fetch the top-level comments of a post"""
+        submission = self._thread_reddit().submission(id=post_id)
+        submission.comments.replace_more(limit=0)
+        comments = []
+        
+        for comment in list(submission.comments)[:comments_per_post]:
+            try:
+                comments.append({
+                    'comment_id': comment.id,
+                    'author': str(comment.author),
+                    'text': comment.body,
+                    'score': comment.score,
+                    'created_utc': datetime.fromtimestamp(comment.created_utc)
+                })
+            except Exception as e:
+                print(f"  - Skipped comment: {str(e)}")
+        return comments
+    
     def save_data(self, data, filename):
         """Save collected data"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filepath = f"data/raw/{filename}_{timestamp}.json"
+        filepath = f"data/raw/{filename}_{timestamp}.parquet"
         
         os.makedirs('data/raw', exist_ok=True)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, default=str, ensure_ascii=False, indent=2)
+        # Comments are stored as an Arrow list<struct> column
+        pd.DataFrame(data).to_parquet(filepath, engine='pyarrow', compression='zstd')
             
         print(f"\nData saved to {filepath}")
         return filepath
@@ -97,5 +124,5 @@ if __name__ == "__main__":
     print("Starting Reddit data collection...")
     collector = RedditDataCollector()
     posts_df = collector.collect_data()
-    collector.save_data(posts_df.to_dict('records'), 'dating_posts')
+    collector.save_data(posts_df, 'dating_posts')
     print("Data collection completed!")
\ No newline at end of file
@@ -7,39 +7,53 @@ from textblob import TextBlob
 import re
 from collections import Counter
 import nltk
-from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+_URL_RE = re.compile(r'http\S+|www\S+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\S+')
+
+ENGAGEMENT_LEVEL_DTYPE = pd.CategoricalDtype(['low', 'medium', 'high'], ordered=True)
+COMMUNICATION_STYLE_DTYPE = pd.CategoricalDtype(['positive', 'neutral', 'critical'])
+
+def _clean_series(texts):
+    """Clean a Series of text data in bulk."""
+    return (
+        texts.fillna('').astype(str).str.lower()
+        .str.replace(_URL_RE, '', regex=True)
+        .str.replace(_PUNCT_RE, ' ', regex=True)
+        .str.replace(_SPACE_RE, ' ', regex=True)
+        .str.strip()
+    )
 
 class DataProcessor:
     def __init__(self):
         self.processed_data = None
         try:
-            nltk.data.find('tokenizers/punkt')
             nltk.data.find('corpora/stopwords')
+            nltk.data.find('sentiment/vader_lexicon.zip')
         except LookupError:
-            nltk.download('punkt')
             nltk.download('stopwords')
+            nltk.download('vader_lexicon')
         self.stop_words = set(stopwords.words('english'))
-        
-    def _clean_text(self, text):
-        """Clean text data."""
-        if pd.isna(text):
-            return ""
-        text = str(text).lower()
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = ' '.join(text.split())
-        return text.strip()
+        self._vader = SentimentIntensityAnalyzer()
         
     def preprocess_data(self, df):
         """Main preprocessing function."""
         try:
             print("\nStarting data preprocessing...")
-            processed_df = df.copy()
+            # Shallow copy: every step below assigns whole columns, so the input is never mutated
+            processed_df = df.copy(deep=False)
+            
+            # Flatten comments first so the list-column can be dropped early
+            comments_df = self._process_comments(processed_df)
+            del processed_df['comments']
             
             # Basic cleaning
-            processed_df['clean_title'] = processed_df['title'].apply(self._clean_text)
-            processed_df['clean_text'] = processed_df['text'].apply(self._clean_text)
+            processed_df['clean_title'] = _clean_series(processed_df['title'])
+            processed_df['clean_text'] = _clean_series(processed_df['text'])
             
             # Time features
             processed_df['created_utc'] = pd.to_datetime(processed_df['created_utc'])
@@ -48,21 +62,15 @@ class DataProcessor:
             # Text features
             processed_df = self._extract_text_features(processed_df)
             
-            # Comment processing
-            processed_df['processed_comments'] = processed_df['comments'].apply(self._process_comments)
-            comment_features = processed_df['processed_comments'].apply(self._extract_comment_features)
-            comment_features_df = pd.DataFrame(comment_features.tolist())
-            processed_df = pd.concat([processed_df, comment_features_df], axis=1)
+            # Comment features
+            comment_features = self._extract_comment_features(comments_df)
+            processed_df[comment_features.columns] = comment_features.reindex(processed_df.index, fill_value=0)
             
             # Engagement and patterns
             processed_df = self._calculate_engagement_levels(processed_df)
             processed_df = self._extract_user_patterns(processed_df)
             processed_df = self._extract_communication_features(processed_df)
             
-            # Clean up
-            columns_to_drop = ['comments', 'processed_comments']
-            processed_df = processed_df.drop(columns=columns_to_drop)
-            
             print("Data preprocessing completed!")
             self.processed_data = processed_df
             return processed_df
@@ -76,91 +84,86 @@ class DataProcessor:
         df['hour_posted'] = df['created_utc'].dt.hour
         df['day_of_week'] = df['created_utc'].dt.dayofweek
         df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        df['time_of_day'] = df['hour_posted'].apply(self._categorize_time_of_day)
+        df['time_of_day'] = self._categorize_time_of_day(df['hour_posted'].to_numpy())
         return df
         
-    def _categorize_time_of_day(self, hour):
-        if 5 <= hour < 12:
-            return 'morning'
-        elif 12 <= hour < 17:
-            return 'afternoon'
-        elif 17 <= hour < 22:
-            return 'evening'
-        else:
-            return 'night'
+    def _categorize_time_of_day(self, hours):
+        codes = np.select(
+            [(hours >= 5) & (hours < 12), (hours >= 12) & (hours < 17), (hours >= 17) & (hours < 22)],
+            [1, 2, 3],
+            default=0
+        )
+        return pd.Categorical.from_codes(codes, categories=['night', 'morning', 'afternoon', 'evening'])
             
     def _extract_text_features(self, df):
         """Extract text features."""
-        df['word_count'] = df['clean_text'].apply(lambda x: len(str(x).split()))
-        df['sentence_count'] = df['clean_text'].apply(lambda x: len(TextBlob(str(x)).sentences))
-        df['avg_word_length'] = df['clean_text'].apply(self._average_word_length)
+        df['word_count'] = df['clean_text'].str.count(_WORD_RE)
+        # clean_text has no punctuation left, so any non-empty text is a single sentence
+        df['sentence_count'] = (df['clean_text'] != '').astype('int32')
+        df['avg_word_length'] = self._map_unique(df['clean_text'], self._average_word_length)
         
         # Sentiment features
-        sentiment_features = df['clean_text'].apply(self._get_detailed_sentiment)
-        df = pd.concat([df, pd.DataFrame(sentiment_features.tolist())], axis=1)
+        df['sentiment_polarity'] = self._get_polarity_scores(df['clean_text'])
+        df['sentiment_subjectivity'] = self._get_subjectivity(df['clean_text'])
         return df
         
     def _average_word_length(self, text):
         words = str(text).split()
         return np.mean([len(word) for word in words]) if words else 0
         
-    def _get_detailed_sentiment(self, text):
-        blob = TextBlob(str(text))
-        return {
-            'sentiment_polarity': blob.sentiment.polarity,
-            'sentiment_subjectivity': blob.sentiment.subjectivity
-        }
+    def _map_unique(self, texts, func, dtype=np.float64):
+        """Apply func once per distinct text and broadcast the results back."""
+        codes, unique_texts = pd.factorize(texts)
+        values = np.fromiter((func(text) for text in unique_texts), dtype=dtype, count=len(unique_texts))
+        return values[codes]
+        
+    def _get_polarity_scores(self, texts):
+        """Score a batch of texts with the shared VADER analyzer."""
+        return self._map_unique(
+            texts,
+            lambda text: self._vader.polarity_scores(str(text))['compound'],
+            dtype=np.float32
+        )
         
-    def _process_comments(self, comments):
-        """Process comments."""
-        processed_comments = []
-        for comment in comments:
-            try:
-                processed_comment = {
-                    'author': str(comment['author']),
-                    'text': self._clean_text(comment['text']),
-                    'score': comment['score'],
-                    'created_utc': pd.to_datetime(comment['created_utc']),
-                    'word_count': len(str(comment['text']).split()),
-                    'sentiment': TextBlob(str(comment['text'])).sentiment.polarity
-                }
-                processed_comments.append(processed_comment)
-            except Exception as e:
-                continue
-        return processed_comments
+    def _get_subjectivity(self, texts):
+        """TextBlob subjectivity for a batch of texts."""
+        return self._map_unique(texts, lambda text: TextBlob(str(text)).sentiment.subjectivity)
         
-    def _extract_comment_features(self, comments):
-        """Extract comment features."""
-        if not comments:
-            return self._get_default_comment_features()
-            
-        comment_lengths = [len(c['text']) for c in comments]
-        word_counts = [c['word_count'] for c in comments]
-        sentiments = [c['sentiment'] for c in comments]
-        response_times = self._calculate_response_times(comments)
+    def _process_comments(self, df):
+        """Flatten comments into one row per comment, indexed by post."""
+        exploded = df['comments'].explode().dropna()
+        comments_df = pd.DataFrame(exploded.tolist(), index=exploded.index)
+        comments_df = comments_df.reindex(columns=['author', 'text', 'score', 'created_utc'])
+        comments_df['created_utc'] = pd.to_datetime(comments_df['created_utc'], errors='coerce', format='ISO8601')
+        
+        # Validate the schema once: drop comments with missing or unparseable fields
+        comments_df = comments_df.dropna(subset=['author', 'text', 'score', 'created_utc'])
         
-        return {
-            'avg_comment_length': np.mean(comment_lengths),
-            'total_comments': len(comments),
-            'avg_words_per_comment': np.mean(word_counts),
-            'comment_sentiment_mean': np.mean(sentiments),
-            'avg_response_time': np.mean(response_times) if response_times else 0
-        }
+        texts = comments_df['text'].astype(str)
+        comments_df['author'] = comments_df['author'].astype(str)
+        comments_df['text'] = _clean_series(texts)
+        comments_df['word_count'] = texts.str.count(_WORD_RE)
+        comments_df['sentiment'] = self._get_polarity_scores(texts)
+        return comments_df
         
-    def _get_default_comment_features(self):
-        return {
-            'avg_comment_length': 0,
-            'total_comments': 0,
-            'avg_words_per_comment': 0,
-            'comment_sentiment_mean': 0,
-            'avg_response_time': 0
-        }
+    def _extract_comment_features(self, comments_df):
+        """Extract comment features."""
+        features = comments_df.assign(
+            comment_length=comments_df['text'].str.len()
+        ).groupby(level=0).agg(
+            avg_comment_length=('comment_length', 'mean'),
+            total_comments=('text', 'size'),
+            avg_words_per_comment=('word_count', 'mean'),
+            comment_sentiment_mean=('sentiment', 'mean')
+        )
+        features['avg_response_time'] = self._calculate_response_times(comments_df)
+        return features
         
-    def _calculate_response_times(self, comments):
-        """Calculate response times."""
-        times = sorted([c['created_utc'] for c in comments])
-        return [(times[i] - times[i-1]).total_seconds() / 3600 
-                for i in range(1, len(times))]
+    def _calculate_response_times(self, comments_df):
+        """Calculate mean response times per post, in hours."""
+        ordered = comments_df.sort_values('created_utc')
+        gaps = ordered.groupby(level=0)['created_utc'].diff().dt.total_seconds() / 3600
+        return gaps.groupby(level=0).mean().fillna(0)
                 
     def _calculate_engagement_levels(self, df):
         """Calculate engagement levels."""
@@ -174,12 +177,12 @@ class DataProcessor:
             df['engagement_level'] = pd.cut(
                 engagement_scores,
                 bins=[-float('inf'), 0.3, 0.7, float('inf')],
-                labels=['low', 'medium', 'high']
-            )
+                labels=ENGAGEMENT_LEVEL_DTYPE.categories
+            ).astype(ENGAGEMENT_LEVEL_DTYPE)
             return df
         except Exception as e:
             print(f"Error in engagement calculation: {str(e)}")
-            df['engagement_level'] = 'medium'
+            df['engagement_level'] = pd.Series('medium', index=df.index, dtype=ENGAGEMENT_LEVEL_DTYPE)
             return df
             
     def _extract_user_patterns(self, df):
@@ -189,7 +192,7 @@ class DataProcessor:
                 'total_comments': 'mean',
                 'avg_response_time': 'mean',
                 'comment_sentiment_mean': 'mean'
-            }).reset_index()
+            })
             
             # Handle missing values
             author_patterns = author_patterns.fillna({
@@ -200,17 +203,17 @@ class DataProcessor:
             # Calculate response categories
             author_patterns['user_response_category'] = 'moderate'
             if len(author_patterns) >= 3:
-                author_patterns['user_response_category'] = pd.qcut(
-                    author_patterns['avg_response_time'],
-                    q=3,
-                    labels=['quick', 'moderate', 'slow']
+                # Tercile thresholds; searchsorted matches qcut's right-closed bins
+                response_times = author_patterns['avg_response_time'].to_numpy()
+                thresholds = np.quantile(response_times, [1/3, 2/3])
+                author_patterns['user_response_category'] = pd.Categorical.from_codes(
+                    np.searchsorted(thresholds, response_times),
+                    categories=['quick', 'moderate', 'slow'],
+                    ordered=True
                 )
                 
-            return df.merge(
-                author_patterns[['author', 'user_response_category']],
-                on='author',
-                how='left'
-            )
+            df['user_response_category'] = df['author'].map(author_patterns['user_response_category'])
+            return df
         except Exception as e:
             print(f"Error in pattern extraction: {str(e)}")
             df['user_response_category'] = 'moderate'
@@ -218,7 +221,9 @@ class DataProcessor:
             
     def _extract_communication_features(self, df):
         """Extract communication features."""
-        df['communication_style'] = df['sentiment_polarity'].apply(
-            lambda x: 'positive' if x > 0.2 else ('critical' if x < -0.2 else 'neutral')
+        polarity = df['sentiment_polarity'].to_numpy()
+        df['communication_style'] = pd.Categorical(
+            np.select([polarity > 0.2, polarity < -0.2], ['positive', 'critical'], default='neutral'),
+            dtype=COMMUNICATION_STYLE_DTYPE
         )
         return df
\ No newline at end of file
@@ -1,9 +1,10 @@
 # File: main.py
 
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import json
+import orjson
 import warnings
 from pathlib import Path
 warnings.filterwarnings('ignore')
@@ -13,6 +14,15 @@ from analysis.behavior_analyzer import BehaviorAnalyzer
 from analysis.recommendation_system import RecommendationSystem
 from analysis.visualizer import Visualizer
 
+ENGAGEMENT_LEVELS = {'low': 0, 'medium': 1, 'high': 2}
+EXPECTED_MESSAGE_FREQUENCY = {'low': 1, 'medium': 3, 'high': 5}
+MATCH_WEIGHTS = {
+    'communication_style': 35,  # 35%
+    'response_time': 25,        # 25%
+    'engagement_level': 25,     # 25%
+    'activity': 15             # 15%
+}
+
 class RedditDatingAnalysis:
     def __init__(self):
         """Initialize all components."""
@@ -21,6 +31,7 @@ class RedditDatingAnalysis:
             Path("data/raw").mkdir(parents=True, exist_ok=True)
             Path("data/processed").mkdir(parents=True, exist_ok=True)
             Path("data/visualizations").mkdir(parents=True, exist_ok=True)
+            Path("data/models").mkdir(parents=True, exist_ok=True)
             
             # Initialize components
             self.data_processor = DataProcessor()
@@ -29,9 +40,11 @@ class RedditDatingAnalysis:
             self.visualizer = Visualizer()
             
             # Initialize data holders
+            self.data_file = None
             self.processed_data = None
             self.behavior_data = None
             self.features = None
+            self.match_arrays = None
             
             print("System initialized successfully!")
         except Exception as e:
@@ -42,7 +55,10 @@ class RedditDatingAnalysis:
         """Load the most recent data file."""
         try:
             raw_dir = 'data/raw'
-            data_files = [f for f in os.listdir(raw_dir) if f.startswith('dating_posts_')]
+            data_files = [
+                f for f in os.listdir(raw_dir)
+                if f.startswith('dating_posts_') and f.endswith(('.parquet', '.json'))
+            ]
             
             if not data_files:
                 raise FileNotFoundError("No data files found. Please run data_collection.py first.")
@@ -51,8 +67,13 @@ class RedditDatingAnalysis:
             filepath = os.path.join(raw_dir, latest_file)
             
             print(f"Loading data from {filepath}")
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            self.data_file = filepath
+            if filepath.endswith('.parquet'):
+                return pd.read_parquet(filepath, engine='pyarrow')
+            
+            # Snapshots saved before the switch to parquet
+            with open(filepath, 'rb') as f:
+                data = orjson.loads(f.read())
             return pd.DataFrame(data)
         except Exception as e:
             print(f"Error loading data: {str(e)}")
@@ -69,22 +90,45 @@ class RedditDatingAnalysis:
             # Analyze behavioral patterns
             print("\nAnalyzing behavioral patterns...")
             self.behavior_data = self.behavior_analyzer.analyze_user_behavior(self.processed_data)
+            self.prepare_match_arrays()
             
-            # Prepare features for recommendation
-            print("Preparing recommendation features...")
-            self.features = self.recommendation_system.prepare_features(self.processed_data)
+            # Reuse the model fitted on this snapshot by an earlier run, if there is one
+            model_dir = os.path.join('data/models', Path(self.data_file).stem)
+            self.features = None
+            if os.path.isdir(model_dir):
+                try:
+                    print(f"Loading recommendation model from {model_dir}")
+                    self.recommendation_system.load(model_dir)
+                    self.features = self.recommendation_system.transform_features(self.processed_data)
+                except Exception as e:
+                    print(f"Cannot reuse the saved model ({str(e)}), refitting it")
             
-            # Fit recommendation model
-            print("Training recommendation model...")
-            self.recommendation_system.fit(self.features)
+            if self.features is None:
+                # Prepare features for recommendation
+                print("Preparing recommendation features...")
+                self.features = self.recommendation_system.fit_features(self.processed_data)
+                
+                # Fit recommendation model
+                print("Training recommendation model...")
+                self.recommendation_system.fit(self.features)
+                
+                # The saved model only speeds up later runs, so failing to write it is not fatal
+                try:
+                    self.recommendation_system.save(model_dir)
+                except Exception as e:
+                    print(f"Could not save the recommendation model ({str(e)}), continuing without it")
             
             # Create visualizations
             print("Generating visualization dashboard...")
-            self.visualizer.create_behavior_dashboard(
+            dashboard = self.visualizer.create_behavior_dashboard(
                 self.behavior_data,
                 'data/visualizations/behavior_dashboard.png'
             )
             
+            # The HTML is written in the background; wait for it before reporting success
+            if dashboard is not None:
+                print(f"Interactive dashboard saved as: {dashboard.result()}")
+            
             print("\nAnalysis pipeline completed!")
             print(f"Total users analyzed: {len(self.behavior_data)}")
             return True
@@ -172,87 +216,91 @@ class RedditDatingAnalysis:
 
         return preferences
 
+    def prepare_match_arrays(self):
+        """Cache behavior columns as contiguous arrays for match scoring."""
+        self.match_arrays = {
+            'avg_response_time': self.behavior_data['avg_response_time'].to_numpy(dtype=np.float64),
+            'sentiment_mean': self.behavior_data['sentiment_mean'].to_numpy(dtype=np.float64),
+            'communication_style': self.behavior_data['communication_style'].to_numpy(dtype=object),
+            'engagement_level': self.behavior_data['engagement_level'].cat.codes.to_numpy(dtype=np.int8),
+            'message_frequency': self.behavior_data['message_frequency'].to_numpy(dtype=np.float64)
+        }
+
     def find_matches(self, preferences, n_recommendations=5):
         """Find matches based on user preferences."""
-        matches = []
-        
-        for user in self.behavior_data.index:
-            user_data = self.behavior_data.loc[user]
-            score = self.calculate_match_score(preferences, user_data)
-            
-            matches.append({
-                'user': user,
-                'score': score,
-                'profile': self.behavior_analyzer.get_user_profile(user, self.behavior_data)
-            })
+        scores = self.calculate_match_scores(preferences, self.match_arrays)
         
-        # Sort by score and get top matches
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        return matches[:n_recommendations]
+        # Stable sort keeps ties in user order; only the top matches get a profile
+        top = np.argsort(-scores, kind='stable')[:n_recommendations]
+        users = self.behavior_data.index
+        return [
+            {
+                'user': users[i],
+                'score': float(scores[i]),
+                'profile': self.behavior_analyzer.get_user_profile(users[i], self.behavior_data)
+            }
+            for i in top
+        ]
 
-    def calculate_match_score(self, preferences, user_data):
-        """Calculate match score based on preferences."""
-        score = 0
-        weights = {
-            'communication_style': 35,  # 35%
-            'response_time': 25,        # 25%
-            'engagement_level': 25,     # 25%
-            'activity': 15             # 15%
-        }
+    def calculate_match_scores(self, preferences, arrays):
+        """Calculate match scores for all users based on preferences."""
+        weights = MATCH_WEIGHTS
+        response_time = arrays['avg_response_time']
+        sentiment = arrays['sentiment_mean']
         
-        try:
-            # Communication style match (35%)
-            user_style = self.behavior_analyzer._get_communication_style(user_data)
-            if user_style == preferences['communication_style']:
-                score += weights['communication_style']
-            elif (user_style == 'neutral' and preferences['communication_style'] != 'critical') or \
-                (preferences['communication_style'] == 'neutral' and user_style != 'critical'):
-                # Partial match for neutral styles
-                score += weights['communication_style'] * 0.5
+        # Communication style match (35%)
+        preferred_style = preferences['communication_style']
+        user_style = arrays['communication_style']
+        style_score = np.where(
+            user_style == preferred_style,
+            1.0,
+            # Partial match for neutral styles
+            np.where(
+                ((user_style == 'neutral') & (preferred_style != 'critical')) |
+                ((preferred_style == 'neutral') & (user_style != 'critical')),
+                0.5,
+                0.0
+            )
+        )
 
-            # Response time match (25%)
-            response_time_diff = abs(user_data['avg_response_time'] - preferences['response_time'])
-            time_score = 0
-            if response_time_diff <= 1:  # Within 1 hour
-                time_score = 1.0
-            elif response_time_diff <= 3:  # Within 3 hours
-                time_score = 0.8
-            elif response_time_diff <= 6:  # Within 6 hours
-                time_score = 0.6
-            elif response_time_diff <= 12:  # Within 12 hours
-                time_score = 0.4
-            else:
-                time_score = max(0, 1 - (response_time_diff / 24))
-            score += weights['response_time'] * time_score
+        # Response time match (25%)
+        response_time_diff = np.abs(response_time - preferences['response_time'])
+        time_score = np.select(
+            [
+                response_time_diff <= 1,   # Within 1 hour
+                response_time_diff <= 3,   # Within 3 hours
+                response_time_diff <= 6,   # Within 6 hours
+                response_time_diff <= 12   # Within 12 hours
+            ],
+            [1.0, 0.8, 0.6, 0.4],
+            default=np.maximum(0, 1 - (response_time_diff / 24))
+        )
 
-            # Engagement level match (25%)
-            if user_data['engagement_level'] == preferences['engagement_level']:
-                score += weights['engagement_level']
-            elif abs(
-                {'low': 0, 'medium': 1, 'high': 2}[user_data['engagement_level']] - 
-                {'low': 0, 'medium': 1, 'high': 2}[preferences['engagement_level']]
-            ) == 1:
-                # Partial match for adjacent engagement levels
-                score += weights['engagement_level'] * 0.5
+        # Engagement level match (25%), partial match for adjacent levels
+        level_diff = np.abs(
+            arrays['engagement_level'] - ENGAGEMENT_LEVELS[preferences['engagement_level']]
+        )
+        engagement_score = np.select([level_diff == 0, level_diff == 1], [1.0, 0.5], default=0.0)
 
-            # Activity pattern match (15%)
-            user_msg_freq = user_data['message_frequency']
-            expected_freq = {'low': 1, 'medium': 3, 'high': 5}[preferences['engagement_level']]
-            activity_diff = abs(user_msg_freq - expected_freq)
-            activity_score = max(0, 1 - (activity_diff / 5))
-            score += weights['activity'] * activity_score
+        # Activity pattern match (15%)
+        expected_freq = EXPECTED_MESSAGE_FREQUENCY[preferences['engagement_level']]
+        activity_diff = np.abs(arrays['message_frequency'] - expected_freq)
+        activity_score = np.maximum(0, 1 - (activity_diff / 5))
 
-            # Additional penalties/bonuses
-            if user_data['avg_response_time'] > 24 and preferences['response_time'] < 6:
-                score *= 0.8  # 20% penalty for very slow responders when quick response is preferred
-            if user_data['sentiment_mean'] < -0.5 and preferences['communication_style'] == 'positive':
-                score *= 0.9  # 10% penalty for very negative sentiment when positive style is preferred
+        score = (
+            weights['communication_style'] * style_score +
+            weights['response_time'] * time_score +
+            weights['engagement_level'] * engagement_score +
+            weights['activity'] * activity_score
+        )
 
-            return min(100, max(0, score))  # Ensure score is between 0 and 100
+        # Additional penalties/bonuses
+        if preferences['response_time'] < 6:
+            score = np.where(response_time > 24, score * 0.8, score)  # 20% penalty for very slow responders
+        if preferences['communication_style'] == 'positive':
+            score = np.where(sentiment < -0.5, score * 0.9, score)  # 10% penalty for very negative sentiment
 
-        except Exception as e:
-            print(f"Warning: Error calculating match score: {str(e)}")
-            return 0  # Return 0 if there's an error
+        return np.clip(score, 0, 100)  # Ensure scores are between 0 and 100
 
 
     def print_matches(self, matches):
@@ -276,7 +324,7 @@ class RedditDatingAnalysis:
                 compatibility_factors.append("Balanced communicator")
                 
             # Response time compatibility
-            response_time = float(profile['messaging_patterns']['response_time'].split()[0])
+            response_time = profile['_response_time_hours']
             if response_time < 1:
                 compatibility_factors.append("Quick responder")
             elif response_time < 3:
@@ -289,8 +337,7 @@ class RedditDatingAnalysis:
                 compatibility_factors.append("Consistently engaged")
                 
             # Activity pattern
-            weekend_activity = float(profile['activity_pattern']['weekend_activity'].strip('%'))
-            if weekend_activity > 50:
+            if profile['_weekend_activity_frac'] > 0.5:
                 compatibility_factors.append("Active on weekends")
             
             # Print compatibility factors
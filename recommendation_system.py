@@ -1,19 +1,90 @@
 # File: analysis/recommendation_system.py
 
+import os
+import shutil
+import tempfile
+import joblib
 import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy import sparse
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer, HashingVectorizer
+
+try:
+    import faiss
+except ImportError:  # FAISS is optional; fall back to exact search with sklearn
+    faiss = None
+
+# Bump whenever the saved pipeline changes, so models written by older code are refitted
+_MODEL_FORMAT_VERSION = 1
+
+# Below this many texts per worker, shipping the chunks to processes costs more than hashing them
+_MIN_HASH_CHUNK_ROWS = 10000
+
+def _faiss_gpu_available():
+    return faiss is not None and hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0
 
 class RecommendationSystem:
-    def __init__(self):
+    def __init__(self, nprobe=5, use_gpu=False, use_pq=False, use_hashing=False, n_jobs=1):
         self.scaler = StandardScaler()
-        self.tfidf = TfidfVectorizer(max_features=1000, stop_words='english')
+        self.use_hashing = use_hashing
+        self.n_jobs = n_jobs
+        # clean_text is already lowercased during preprocessing, so the vectorizers skip that pass
+        if use_hashing:
+            # Stateless: no vocabulary to learn, so the text is only scanned once
+            self.tfidf = HashingVectorizer(
+                n_features=2**14,
+                alternate_sign=False,
+                norm='l2',
+                stop_words='english',
+                lowercase=False,
+                dtype=np.float32
+            )
+        else:
+            self.tfidf = TfidfVectorizer(
+                max_features=1000,
+                stop_words='english',
+                lowercase=False,
+                dtype=np.float32
+            )
         self.count_vec = CountVectorizer(max_features=500, stop_words='english')
+        # LSA: project the sparse text block onto a few dense topic directions
+        self.svd = TruncatedSVD(n_components=64, random_state=0)
         self.knn_model = NearestNeighbors(n_neighbors=5, metric='cosine')
+        self.nprobe = nprobe
+        self.use_gpu = use_gpu
+        self.use_pq = use_pq
+        self.index = None
+        self._gpu_resources = None
+        
+    def fit_features(self, df):
+        """Fit the scaler and text vectorizer, and return the feature matrix"""
+        behavioral_features, texts = self._feature_inputs(df)
+        behavioral_scaled = self.scaler.fit_transform(behavioral_features)
+        if self.use_hashing:
+            text_features = self._hash_texts(texts)
+        else:
+            text_features = self.tfidf.fit_transform(texts)
         
-    def prepare_features(self, df):
-        """Prepare features for recommendation"""
+        # The SVD needs fewer components than there are terms and documents
+        n_components = min(64, text_features.shape[0], text_features.shape[1] - 1)
+        self.svd.set_params(n_components=max(1, n_components))
+        text_reduced = self.svd.fit_transform(text_features)
+        return self._combine_features(behavioral_scaled, text_reduced)
+    
+    def transform_features(self, df):
+        """Build the feature matrix with the already fitted scaler and text vectorizer"""
+        behavioral_features, texts = self._feature_inputs(df)
+        behavioral_scaled = self.scaler.transform(behavioral_features)
+        if self.use_hashing:
+            text_features = self._hash_texts(texts)
+        else:
+            text_features = self.tfidf.transform(texts)
+        return self._combine_features(behavioral_scaled, self.svd.transform(text_features))
+    
+    def _feature_inputs(self, df):
         # Behavioral features
         behavioral_features = df[[
             'avg_response_time',
@@ -23,25 +94,199 @@ class RecommendationSystem:
         ]].fillna(0)
         
         # Text features
-        text_features = self.tfidf.fit_transform(df['clean_text'].fillna(''))
-        
-        # Combine features
-        combined_features = np.hstack([
-            self.scaler.fit_transform(behavioral_features),
-            text_features.toarray()
-        ])
+        texts = df['clean_text'].fillna('')
+        return behavioral_features, texts
+    
+    def _combine_features(self, behavioral_scaled, text_reduced):
+        # Combine features; both blocks are dense once the text is reduced, so write them
+        # straight into one float32 buffer instead of stacking and then casting
+        n_behavioral = behavioral_scaled.shape[1]
+        combined = np.empty((len(behavioral_scaled), n_behavioral + text_reduced.shape[1]), dtype=np.float32)
+        combined[:, :n_behavioral] = behavioral_scaled
+        combined[:, n_behavioral:] = text_reduced
+        return combined
+    
+    def _hash_texts(self, texts):
+        """Hash texts in row chunks across worker processes (the vectorizer is stateless)"""
+        n_chunks = min(effective_n_jobs(self.n_jobs), len(texts) // _MIN_HASH_CHUNK_ROWS)
+        if n_chunks <= 1:
+            return self.tfidf.transform(texts)
         
-        return combined_features
+        chunks = np.array_split(np.asarray(texts, dtype=object), n_chunks)
+        parts = Parallel(n_jobs=self.n_jobs)(delayed(self.tfidf.transform)(chunk) for chunk in chunks)
+        return sparse.vstack(parts, format='csr')
     
     def fit(self, features):
-        """Fit the KNN model"""
-        self.knn_model.fit(features)
+        """Fit the KNN index"""
+        if faiss is None:
+            self.knn_model.fit(features)
+            return self
+        
+        # Cosine similarity is the inner product of L2-normalized vectors
+        if sparse.issparse(features):
+            features = features.toarray()
+        x = np.array(features, dtype=np.float32, order='C')
+        faiss.normalize_L2(x)
+        
+        if self.use_gpu:
+            if _faiss_gpu_available():
+                # Exact search on the GPU is a single GEMM + top-k per query batch
+                self._gpu_resources = faiss.StandardGpuResources()
+                self.index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, faiss.IndexFlatIP(x.shape[1]))
+                self.index.add(x)
+                return self
+            print("GPU FAISS is not available, using the CPU index instead.")
+        
+        # Inverted lists so a query only scans the nprobe closest clusters
+        n, d = x.shape
+        nlist = max(1, min(100, int(np.sqrt(n))))
+        if self.use_pq and n >= 256:
+            # 8-bit product quantization: 8 bytes per user instead of 4*d. Zero columns pad d to a
+            # multiple of 8 (queries get the same padding) without changing any inner product
+            d = -(-d // 8) * 8
+            x = self._pad_columns(x, d)
+            quantizer = faiss.IndexFlatIP(d)
+            self.index = faiss.IndexIVFPQ(quantizer, d, nlist, 8, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            quantizer = faiss.IndexFlatIP(d)
+            if self.use_pq:
+                print("Too few users to train a PQ codebook, using the flat IVF index instead.")
+            self.index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        self.index.train(x)
+        self.index.add(x)
+        self.index.nprobe = self.nprobe
+        return self
+    
+    def _pad_columns(self, x, d):
+        if x.shape[1] == d:
+            return x
+        padded = np.zeros((len(x), d), dtype=np.float32)
+        padded[:, :x.shape[1]] = x
+        return padded
+    
+    def _model_config(self):
+        """Options a saved model must have been built with to be reused by this instance"""
+        return {
+            'format_version': _MODEL_FORMAT_VERSION,
+            'use_hashing': self.use_hashing,
+            'use_pq': self.use_pq,
+            'use_gpu': self.use_gpu and _faiss_gpu_available(),
+            'faiss': faiss is not None
+        }
+    
+    def save(self, path):
+        """Save the fitted feature pipeline and KNN index to a directory"""
+        # Write into a temporary directory next to the target and rename it into place,
+        # so a crash midway never leaves a partial model behind
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+        try:
+            joblib.dump(
+                {
+                    'config': self._model_config(),
+                    'scaler': self.scaler,
+                    'tfidf': self.tfidf,
+                    'svd': self.svd,
+                    'knn_model': self.knn_model if self.index is None else None
+                },
+                os.path.join(tmp_path, 'features.joblib')
+            )
+            if self.index is not None:
+                # FAISS indexes are not picklable; write them in FAISS's own format
+                index = self.index if self._gpu_resources is None else faiss.index_gpu_to_cpu(self.index)
+                faiss.write_index(index, os.path.join(tmp_path, 'users.faiss'))
+            
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return path
+    
+    def load(self, path, mmap=True):
+        """Load a feature pipeline and KNN index written by save(), memory-mapping them by default"""
+        # Memory-mapped files are served from the page cache, so workers loading the same model share it
+        state = joblib.load(os.path.join(path, 'features.joblib'), mmap_mode='r' if mmap else None)
+        if state.get('config') != self._model_config():
+            raise ValueError(f"{path} was saved by a different pipeline version or configuration")
+        
+        # Read everything before touching self, so a failed load leaves this instance unchanged
+        index, gpu_resources = None, None
+        if faiss is not None:
+            use_gpu = self.use_gpu and _faiss_gpu_available()
+            index = faiss.read_index(
+                os.path.join(path, 'users.faiss'),
+                faiss.IO_FLAG_MMAP if mmap and not use_gpu else 0
+            )
+            if use_gpu:
+                gpu_resources = faiss.StandardGpuResources()
+                index = faiss.index_cpu_to_gpu(gpu_resources, 0, index)
+            elif hasattr(index, 'nprobe'):
+                index.nprobe = self.nprobe
+        
+        self.scaler = state['scaler']
+        self.tfidf = state['tfidf']
+        self.svd = state['svd']
+        if index is None:
+            self.knn_model = state['knn_model']
+        self.index = index
+        self._gpu_resources = gpu_resources
         return self
     
-    def get_recommendations(self, user_features, n_recommendations=3):
-        """Get recommendations for a user"""
-        distances, indices = self.knn_model.kneighbors(
+    def get_recommendations(self, user_features, n_recommendations=3, user_index=None, exclude_self=True):
+        """Get recommendations for a fitted user; pass exclude_self=False for a user outside the index"""
+        indices, distances = self.get_recommendations_batch(
             user_features.reshape(1, -1),
-            n_neighbors=n_recommendations + 1
+            n_recommendations,
+            user_indices=None if user_index is None else [user_index],
+            exclude_self=exclude_self
         )
-        return indices[0][1:], distances[0][1:]
\ No newline at end of file
+        found = indices[0] >= 0
+        return indices[0][found], distances[0][found]
+    
+    def get_recommendations_batch(self, user_features, n_recommendations=3, user_indices=None, exclude_self=True):
+        """Get recommendations for many users with a single search, one row per user"""
+        if sparse.issparse(user_features):
+            user_features = user_features.toarray()
+        # The fitted features are C-contiguous float32, so a matching query is not copied again
+        queries = np.ascontiguousarray(user_features, dtype=np.float32).reshape(len(user_features), -1)
+        
+        # Approximate scores can rank a user below its neighbours, so the user itself is dropped by
+        # row id rather than assumed to be the first hit; two spare hits cover the exclusion
+        n_search = n_recommendations + 2
+        self_distances = np.zeros((len(queries), 1), dtype=np.float32)
+        if self.index is None:
+            distances, indices = self.knn_model.kneighbors(
+                queries,
+                n_neighbors=min(n_search, self.knn_model.n_samples_fit_)
+            )
+        else:
+            # normalize_L2 works in place, so normalize a (padded) copy rather than the caller's array
+            padded = self._pad_columns(queries, self.index.d)
+            if padded is queries:
+                padded = queries.copy()
+            faiss.normalize_L2(padded)
+            similarities, indices = self.index.search(padded, n_search)
+            distances = 1 - similarities
+            if isinstance(self.index, faiss.IndexIVFPQ):
+                # A stored user is scored against its PQ reconstruction, not against itself
+                reconstructed = self.index.sa_decode(self.index.sa_encode(padded))
+                self_distances = 1 - np.sum(padded * reconstructed, axis=1, keepdims=True)
+        
+        # FAISS pads with -1 when the probed clusters hold too few users
+        keep = indices >= 0
+        if exclude_self and user_indices is not None:
+            keep &= indices != np.asarray(user_indices).reshape(-1, 1)
+        elif exclude_self:
+            # Without row ids, the user is the hit scored exactly like its own stored vector
+            # (identical users are indistinguishable here and are dropped too)
+            keep &= np.abs(distances - self_distances) > 1e-5
+        
+        # A stable sort moves the kept hits to the front of each row, still in rank order
+        order = np.argsort(~keep, axis=1, kind='stable')[:, :n_recommendations]
+        keep = np.take_along_axis(keep, order, axis=1)
+        indices = np.where(keep, np.take_along_axis(indices, order, axis=1), -1)
+        distances = np.where(keep, np.take_along_axis(distances, order, axis=1), np.inf)
+        return indices, distances
\ No newline at end of file